@@ -21,6 +21,7 @@ class LegoMosaicGenerator:
         self.MAX_LENGTH = 30  # Maximum length in inches
         self.MAX_LEGO_PIECES = int(self.MAX_LENGTH / self.LEGO_WIDTH)  # Maximum number of Lego pieces in one dimension
         self.GRID_SIZE = 10  # Size of grid for instructions (10x10)
+        self.STUD_SIZE = 20  # Size of one stud in pixels in the stud preview
         
         # Load Lego colors
         self.load_lego_colors()
@@ -33,6 +34,18 @@ class LegoMosaicGenerator:
         self.mosaic_image = None
         self.brick_counts = {}
         self.brick_colors = {}
+        self.color_index_map = None  # Lego palette index of every brick
+        
+        # Editing state
+        self.undo_stack = []  # Brick edits as (x, y, old color index, new color index)
+        self.redo_stack = []
+        self.dirty_sections = set()  # (grid_row, grid_col) sections changed since the last export
+        self.instructions_dir = None  # Folder of the last exported instructions
+        self.overview_image = None  # Cached overview image of the last export
+        self.overview_studs = False  # Whether the cached overview image was drawn with studs
+        
+        # Pre-rendered stud sprites, one atlas of all Lego colors per stud size
+        self.stud_atlas_cache = {}
         
     def load_lego_colors(self):
         """Load Lego colors from Excel file"""
@@ -82,6 +95,23 @@ class LegoMosaicGenerator:
         ttk.Button(top_frame, text="Browse", command=self.browse_file).grid(row=0, column=2, padx=5, pady=5)
         ttk.Button(top_frame, text="Generate Mosaic", command=self.generate_mosaic).grid(row=0, column=3, padx=5, pady=5)
         
+        # Palette reduction: limit the mosaic to at most this many colors (0 = use all colors)
+        ttk.Label(top_frame, text="Max colors:").grid(row=1, column=0, padx=5, pady=5)
+        self.max_colors_var = tk.IntVar(value=0)
+        ttk.Spinbox(top_frame, from_=0, to=len(self.lego_colors), textvariable=self.max_colors_var,
+                    width=5).grid(row=1, column=1, padx=5, pady=5, sticky="w")
+        
+        # Preview style: flat colored squares or realistic studs
+        self.stud_preview_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(top_frame, text="Stud preview", variable=self.stud_preview_var,
+                        command=self.on_preview_style_changed).grid(row=1, column=3, padx=5, pady=5)
+        
+        # Multi-size comparison: longest side of each mosaic in bricks
+        ttk.Label(top_frame, text="Compare sizes:").grid(row=2, column=0, padx=5, pady=5)
+        self.compare_sizes_var = tk.StringVar(value=f"32, 48, 64, {self.MAX_LEGO_PIECES}")
+        ttk.Entry(top_frame, textvariable=self.compare_sizes_var, width=30).grid(row=2, column=1, padx=5, pady=5, sticky="w")
+        ttk.Button(top_frame, text="Compare Sizes", command=self.compare_sizes).grid(row=2, column=3, padx=5, pady=5)
+        
         # Middle panel - Images
         images_frame = ttk.Frame(main_frame)
         images_frame.pack(fill=tk.BOTH, expand=True, pady=10)
@@ -97,8 +127,27 @@ class LegoMosaicGenerator:
         mosaic_frame = ttk.LabelFrame(images_frame, text="Lego Mosaic")
         mosaic_frame.grid(row=0, column=1, padx=5, pady=5, sticky="nsew")
         
-        self.mosaic_image_label = ttk.Label(mosaic_frame)
+        self.mosaic_image_label = ttk.Label(mosaic_frame, anchor=tk.CENTER)
         self.mosaic_image_label.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.mosaic_image_label.bind("<Button-1>", self.on_mosaic_click)
+        
+        # Brick editing controls - click a brick in the mosaic to recolor it
+        edit_frame = ttk.Frame(mosaic_frame)
+        edit_frame.pack(fill=tk.X, padx=5, pady=5)
+        
+        ttk.Label(edit_frame, text="Brick color:").pack(side=tk.LEFT, padx=5)
+        self.paint_color_combo = ttk.Combobox(edit_frame, values=self.lego_color_names, state="readonly", width=25)
+        if self.lego_color_names:
+            self.paint_color_combo.current(0)
+        self.paint_color_combo.pack(side=tk.LEFT, padx=5)
+        
+        self.undo_btn = ttk.Button(edit_frame, text="Undo", command=self.undo_edit, state=tk.DISABLED)
+        self.undo_btn.pack(side=tk.LEFT, padx=5)
+        self.redo_btn = ttk.Button(edit_frame, text="Redo", command=self.redo_edit, state=tk.DISABLED)
+        self.redo_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.root.bind("<Control-z>", lambda event: self.undo_edit())
+        self.root.bind("<Control-y>", lambda event: self.redo_edit())
         
         # Set weight for the columns
         images_frame.columnconfigure(0, weight=1)
@@ -124,6 +173,11 @@ class LegoMosaicGenerator:
                                       command=self.generate_instructions, state=tk.DISABLED)
         self.download_btn.pack(pady=5)
         
+        # Button to re-export only the sections edited since the last export
+        self.update_btn = ttk.Button(main_frame, text="Update Building Instructions",
+                                    command=self.update_instructions, state=tk.DISABLED)
+        self.update_btn.pack(pady=5)
+        
         # Status bar
         self.status_var = tk.StringVar()
         self.status_var.set("Ready")
@@ -170,6 +224,7 @@ class LegoMosaicGenerator:
             photo = ImageTk.PhotoImage(display_image)
             label.configure(image=photo)
             label.image = photo  # Keep a reference to prevent garbage collection
+            label.display_size = (new_width, new_height)  # Used to map clicks back to the image
     
     def generate_mosaic(self):
         """Generate the Lego mosaic from the original image"""
@@ -177,48 +232,157 @@ class LegoMosaicGenerator:
             messagebox.showwarning("Warning", "Please select an image first")
             return
         
+        if not self.lego_colors:
+            messagebox.showwarning("Warning", "No Lego colors loaded")
+            return
+        
+        if not self.confirm_discard_edits():
+            return
+        
         try:
             self.status_var.set("Generating mosaic...")
             
-            # Get original image dimensions
-            width, height = self.original_image.size
-            
-            # Calculate the resize factor based on the maximum Lego size constraint
-            resize_factor = self.calculate_resize_factor(width, height)
-            
-            # Calculate new dimensions
-            width_reduced = int(width / resize_factor)
-            height_reduced = int(height / resize_factor)
+            # Same resize and quantize pipeline as the size comparison, at the maximum Lego size
+            result = self.generate_multi_size_mosaics(self.original_image, [self.MAX_LEGO_PIECES],
+                                                      self.get_max_colors())[0]
             
+            # Make it the current mosaic, display it and enable the download button
+            self.use_mosaic_result(result)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to generate mosaic: {e}")
+            self.status_var.set("Error generating mosaic")
+    
+    def get_max_colors(self):
+        """Return the requested maximum number of colors, or None to use every Lego color"""
+        try:
+            max_colors = self.max_colors_var.get()
+        except tk.TclError:
+            return None
+        return max_colors if max_colors > 0 else None
+    
+    def compare_sizes(self):
+        """Generate mosaics for several sizes at once and show them side by side"""
+        if not self.original_image:
+            messagebox.showwarning("Warning", "Please select an image first")
+            return
+        
+        if not self.lego_colors:
+            messagebox.showwarning("Warning", "No Lego colors loaded")
+            return
+        
+        try:
+            target_sizes = [int(size) for size in re.split(r"[,\s]+", self.compare_sizes_var.get().strip()) if size]
+        except ValueError:
+            messagebox.showerror("Error", "Sizes must be whole numbers of bricks, e.g. 32, 48, 64, 95")
+            return
+        
+        try:
+            self.status_var.set("Generating mosaics...")
+            results = self.generate_multi_size_mosaics(self.original_image, target_sizes, self.get_max_colors())
+            self.show_size_comparison(results)
+            self.status_var.set(f"Generated {len(results)} mosaic sizes")
+        except ValueError as e:
+            # Sizes outside 1..MAX_LEGO_PIECES
+            messagebox.showerror("Error", str(e))
+            self.status_var.set("Invalid mosaic sizes")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to generate mosaics: {e}")
+            self.status_var.set("Error generating mosaics")
+    
+    def generate_multi_size_mosaics(self, image, target_sizes, max_colors=None):
+        """Generate one mosaic per target size (longest side in bricks) from a single decode of the image.
+        
+        This is also the pipeline behind generate_mosaic, so every size matches a regular run at that size.
+        
+        Returns a list of dicts with the mosaic image, its palette index map, brick counts and brick colors,
+        one per distinct mosaic size. Raises ValueError unless every size is between 1 and MAX_LEGO_PIECES.
+        """
+        if not target_sizes or min(target_sizes) < 1:
+            raise ValueError("Please enter at least one size of 1 brick or more")
+        if max(target_sizes) > self.MAX_LEGO_PIECES:
+            raise ValueError(f"Sizes cannot exceed {self.MAX_LEGO_PIECES} bricks ({self.MAX_LENGTH} inches)")
+        
+        # Decode once; every size is sampled from the same full-resolution pixels
+        image = image.convert("RGB")
+        width, height = image.size
+        
+        # Sizes that give the same mosaic dimensions (e.g. repeated or larger than the image) are kept once
+        mosaic_sizes = []
+        for target_size in target_sizes:
+            resize_factor = self.calculate_resize_factor(width, height, target_size)
+            dimensions = (max(1, int(width / resize_factor)), max(1, int(height / resize_factor)))
+            if dimensions not in mosaic_sizes:
+                mosaic_sizes.append(dimensions)
+        
+        # Colors seen at one size are usually seen again at the others
+        color_cache = {}
+        
+        results = []
+        for width_reduced, height_reduced in mosaic_sizes:
             # Resize the image (pixelize)
-            resized_img = self.original_image.resize((width_reduced, height_reduced), Image.NEAREST)
-            
-            # Convert to Lego colors
-            lego_img = self.convert_to_lego_colors(resized_img)
+            resized_img = image.resize((width_reduced, height_reduced), Image.NEAREST)
             
-            # Save mosaic image
-            self.mosaic_image = lego_img
-            
-            # Display the mosaic image
-            self.display_image(lego_img, self.mosaic_image_label, max_size=400)
+            index_map = self.quantize_to_palette(resized_img, max_colors, color_cache)
+            lego_img, brick_counts, brick_colors = self.build_mosaic_from_indices(index_map)
+            results.append({
+                "image": lego_img,
+                "index_map": index_map,
+                "brick_counts": brick_counts,
+                "brick_colors": brick_colors,
+            })
+        
+        return results
+    
+    def show_size_comparison(self, results):
+        """Show the mosaics of several sizes side by side in a new window"""
+        window = tk.Toplevel(self.root)
+        window.title("Compare Mosaic Sizes")
+        
+        for column, result in enumerate(results):
+            width, height = result["image"].size
+            frame = ttk.LabelFrame(window, text=f"{width}x{height} bricks")
+            frame.grid(row=0, column=column, padx=5, pady=5, sticky="n")
             
-            # Calculate and display brick information
-            self.display_brick_info(width_reduced, height_reduced)
+            image_label = ttk.Label(frame)
+            image_label.pack(padx=5, pady=5)
+            self.display_image(self.get_preview_image(result["image"], result["index_map"]), image_label, max_size=250)
             
-            # Enable the download instructions button
-            self.download_btn.config(state=tk.NORMAL)
+            info = (f"Total Bricks: {width * height}\n"
+                    f"Colors: {len(result['brick_counts'])}\n"
+                    f"Physical Size: {width * self.LEGO_WIDTH:.2f}\" x {height * self.LEGO_WIDTH:.2f}\"")
+            ttk.Label(frame, text=info, justify=tk.LEFT).pack(padx=5, pady=5)
             
-            # Update status
-            self.status_var.set(f"Mosaic generated: {width_reduced}x{height_reduced} pieces")
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to generate mosaic: {e}")
-            self.status_var.set("Error generating mosaic")
+            ttk.Button(frame, text="Use This Size",
+                       command=lambda result=result: self.use_compared_size(result)).pack(pady=5)
+    
+    def use_compared_size(self, result):
+        """Replace the current mosaic with one from the size comparison, unless the user keeps their edits"""
+        if self.confirm_discard_edits():
+            self.use_mosaic_result(result)
+    
+    def use_mosaic_result(self, result):
+        """Make a mosaic from the size comparison the current mosaic"""
+        self.mosaic_image = result["image"].copy()
+        self.color_index_map = result["index_map"].copy()
+        self.brick_counts = Counter(result["brick_counts"])
+        self.brick_colors = dict(result["brick_colors"])
+        self.reset_edit_state()
+        
+        width, height = self.mosaic_image.size
+        self.display_image(self.get_preview_image(self.mosaic_image, self.color_index_map),
+                           self.mosaic_image_label, max_size=400)
+        self.display_brick_info(width, height)
+        self.download_btn.config(state=tk.NORMAL)
+        self.status_var.set(f"Mosaic generated: {width}x{height} pieces")
     
-    def calculate_resize_factor(self, width, height):
+    def calculate_resize_factor(self, width, height, max_pieces=None):
         """Calculate the resize factor based on the maximum physical size constraint"""
+        if max_pieces is None:
+            max_pieces = self.MAX_LEGO_PIECES
+        
         # Calculate how many Lego pieces would fit in the max length
-        width_in_lego = width / self.MAX_LEGO_PIECES
-        height_in_lego = height / self.MAX_LEGO_PIECES
+        width_in_lego = width / max_pieces
+        height_in_lego = height / max_pieces
         
         # Use the larger dimension to determine resize factor
         resize_factor = max(width_in_lego, height_in_lego)
@@ -226,59 +390,331 @@ class LegoMosaicGenerator:
         # Ensure we have at least a factor of 1
         return max(1, resize_factor)
     
-    def convert_to_lego_colors(self, image):
-        """Convert the image to use only Lego colors"""
-        if not self.lego_colors:
-            messagebox.showwarning("Warning", "No Lego colors loaded")
-            return image
+    def quantize_to_palette(self, image, max_colors=None, color_cache=None):
+        """Return a 2D array holding the Lego palette index of every pixel in the image.
         
-        # Create a new image with the same size
-        lego_image = Image.new("RGB", image.size)
+        Passing the same color_cache dict for several images reuses the color distances computed before.
+        """
+        # Work on the deduplicated color histogram instead of individual pixels
+        unique_colors, counts, inverse = self.compute_color_histogram(image)
         
-        # Convert image to RGB mode if it's not already
-        image = image.convert("RGB")
+        # Distance from every unique image color to every Lego color
+        if color_cache is None:
+            distances = self.color_distances(unique_colors)
+        else:
+            distances = self.cached_color_distances(unique_colors, color_cache)
         
-        # Prepare a dictionary to count bricks by color
-        self.brick_counts = Counter()
-        self.brick_colors = {}
+        if max_colors and 0 < max_colors < len(self.lego_colors):
+            # Restrict the palette to the best colors for this image
+            selected = self.select_palette_subset(distances, counts, max_colors)
+            nearest = selected[np.argmin(distances[:, selected], axis=1)]
+        else:
+            nearest = np.argmin(distances, axis=1)
         
-        # Process each pixel
-        for y in range(image.height):
-            for x in range(image.width):
-                # Get the RGB values of the pixel
-                r, g, b = image.getpixel((x, y))
-                
-                # Find the closest Lego color
-                closest_color_idx = self.find_closest_color((r, g, b))
-                
-                # Get the closest color
-                lego_color = self.lego_colors[closest_color_idx]
-                color_name = self.lego_color_names[closest_color_idx]
+        return nearest[inverse].reshape(image.height, image.width)
+    
+    def compute_color_histogram(self, image):
+        """Return the unique colors of an image, their pixel counts and the pixel-to-color mapping"""
+        pixels = np.asarray(image.convert("RGB"), dtype=np.int64).reshape(-1, 3)
+        
+        # Pack RGB into a single integer so np.unique works on a 1D array
+        packed = (pixels[:, 0] << 16) | (pixels[:, 1] << 8) | pixels[:, 2]
+        unique_packed, inverse, counts = np.unique(packed, return_inverse=True, return_counts=True)
+        
+        unique_colors = np.stack([(unique_packed >> 16) & 0xFF,
+                                  (unique_packed >> 8) & 0xFF,
+                                  unique_packed & 0xFF], axis=1)
+        return unique_colors, counts, inverse.reshape(-1)
+    
+    def color_distances(self, colors):
+        """Euclidean RGB distance from each color to each Lego color (rows: colors, columns: Lego colors)"""
+        palette = np.asarray(self.lego_colors, dtype=np.float64)
+        diff = np.asarray(colors, dtype=np.float64)[:, None, :] - palette[None, :, :]
+        return np.sqrt(np.sum(diff ** 2, axis=2))
+    
+    def cached_color_distances(self, colors, color_cache):
+        """Same as color_distances, but only computes rows for colors missing from color_cache"""
+        packed = (colors[:, 0] << 16) | (colors[:, 1] << 8) | colors[:, 2]
+        cached_keys = color_cache.get("keys", np.empty(0, dtype=np.int64))
+        cached_distances = color_cache.get("distances", np.empty((0, len(self.lego_colors))))
+        
+        # Look the packed colors up in the sorted cache keys
+        positions = np.minimum(np.searchsorted(cached_keys, packed), max(len(cached_keys) - 1, 0))
+        hits = cached_keys[positions] == packed if len(cached_keys) else np.zeros(len(packed), dtype=bool)
+        
+        distances = np.empty((len(colors), len(self.lego_colors)))
+        distances[hits] = cached_distances[positions[hits]]
+        
+        misses = ~hits
+        if misses.any():
+            distances[misses] = self.color_distances(colors[misses])
+            
+            # Add the new colors, keeping the keys sorted for the next lookup
+            keys = np.concatenate([cached_keys, packed[misses]])
+            order = np.argsort(keys)
+            color_cache["keys"] = keys[order]
+            color_cache["distances"] = np.concatenate([cached_distances, distances[misses]])[order]
+        
+        return distances
+    
+    def select_palette_subset(self, distances, weights, k):
+        """Choose k Lego colors that best represent an image using histogram-weighted k-medoids"""
+        distances = np.asarray(distances, dtype=np.float32)
+        weights = np.asarray(weights, dtype=np.float32)
+        
+        # Greedy build: repeatedly add the Lego color that lowers the weighted cost the most
+        selected = []
+        best_dist = np.full(distances.shape[0], np.inf, dtype=np.float32)
+        for _ in range(k):
+            costs = weights @ np.minimum(best_dist[:, None], distances)
+            costs[selected] = np.inf
+            choice = int(np.argmin(costs))
+            selected.append(choice)
+            best_dist = np.minimum(best_dist, distances[:, choice])
+        
+        # Swap phase: replace a selected color with an unselected one while that lowers the cost
+        current_cost = weights @ best_dist
+        improved = k > 1
+        while improved:
+            improved = False
+            for pos in range(k):
+                # Distance to the nearest selected color once selected[pos] is removed
+                others = selected[:pos] + selected[pos + 1:]
+                base_dist = distances[:, others].min(axis=1)
                 
-                # Set the pixel to the Lego color
-                lego_image.putpixel((x, y), lego_color)
+                costs = weights @ np.minimum(base_dist[:, None], distances)
+                costs[others] = np.inf
+                choice = int(np.argmin(costs))
                 
-                # Count this brick
-                self.brick_counts[color_name] += 1
-                self.brick_colors[color_name] = lego_color
+                if costs[choice] < current_cost * (1 - 1e-6):
+                    selected[pos] = choice
+                    current_cost = costs[choice]
+                    improved = True
         
-        return lego_image
+        return np.array(sorted(selected), dtype=np.int64)
     
-    def find_closest_color(self, rgb):
-        """Find the index of the closest Lego color to the given RGB value"""
-        r, g, b = rgb
-        min_distance = float('inf')
-        closest_idx = 0
+    def build_mosaic_from_indices(self, index_map):
+        """Build the mosaic image, brick counts and brick colors from a palette index map"""
+        palette = np.asarray(self.lego_colors, dtype=np.uint8)
+        lego_image = Image.fromarray(palette[index_map], "RGB")
         
-        for i, (lr, lg, lb) in enumerate(self.lego_colors):
-            # Calculate Euclidean distance in RGB space
-            distance = math.sqrt((r - lr)**2 + (g - lg)**2 + (b - lb)**2)
-            
-            if distance < min_distance:
-                min_distance = distance
-                closest_idx = i
+        # Count bricks per Lego color
+        brick_counts = Counter()
+        brick_colors = {}
+        indices, counts = np.unique(index_map, return_counts=True)
+        for idx, count in zip(indices, counts):
+            color_name = self.lego_color_names[idx]
+            brick_counts[color_name] += int(count)
+            brick_colors[color_name] = self.lego_colors[idx]
+        
+        return lego_image, brick_counts, brick_colors
+    
+    def confirm_discard_edits(self):
+        """Ask before replacing a mosaic that has brick edits. Returns True if the mosaic may be replaced"""
+        if not self.undo_stack and not self.dirty_sections:
+            return True
+        return messagebox.askyesno("Discard Edits",
+                                   "The current mosaic has brick edits that will be lost. Continue?")
+    
+    def reset_edit_state(self):
+        """Clear the undo/redo history and forget the last exported instructions"""
+        self.undo_stack = []
+        self.redo_stack = []
+        self.dirty_sections = set()
+        self.instructions_dir = None
+        self.overview_image = None
+        self.update_edit_buttons()
+    
+    def update_edit_buttons(self):
+        """Enable or disable the undo, redo and update buttons to match the editing state"""
+        self.undo_btn.config(state=tk.NORMAL if self.undo_stack else tk.DISABLED)
+        self.redo_btn.config(state=tk.NORMAL if self.redo_stack else tk.DISABLED)
+        can_update = self.instructions_dir is not None and bool(self.dirty_sections)
+        self.update_btn.config(state=tk.NORMAL if can_update else tk.DISABLED)
+    
+    def on_mosaic_click(self, event):
+        """Recolor the clicked brick with the selected Lego color"""
+        label = self.mosaic_image_label
+        if self.mosaic_image is None or self.color_index_map is None or not hasattr(label, "display_size"):
+            return
+        
+        color_idx = self.paint_color_combo.current()
+        if color_idx < 0:
+            return
+        
+        # The image is centered in the label, so remove the margin before scaling
+        display_width, display_height = label.display_size
+        offset_x = (label.winfo_width() - display_width) // 2
+        offset_y = (label.winfo_height() - display_height) // 2
+        
+        width, height = self.mosaic_image.size
+        x = int((event.x - offset_x) * width / display_width)
+        y = int((event.y - offset_y) * height / display_height)
+        if not (0 <= x < width and 0 <= y < height):
+            return
+        
+        if not self.edit_brick(x, y, color_idx):
+            return
+        
+        self.refresh_mosaic()
+        self.status_var.set(f"Brick ({x+1},{y+1}) changed to {self.lego_color_names[color_idx]}")
+    
+    def undo_edit(self):
+        """Undo the last brick edit"""
+        edit = self.undo_brick_edit()
+        if edit is None:
+            return
+        x, y, old_idx, new_idx = edit
+        self.refresh_mosaic()
+        self.status_var.set(f"Undo: brick ({x+1},{y+1}) back to {self.lego_color_names[old_idx]}")
+    
+    def redo_edit(self):
+        """Redo the last undone brick edit"""
+        edit = self.redo_brick_edit()
+        if edit is None:
+            return
+        x, y, old_idx, new_idx = edit
+        self.refresh_mosaic()
+        self.status_var.set(f"Redo: brick ({x+1},{y+1}) changed to {self.lego_color_names[new_idx]}")
+    
+    def edit_brick(self, x, y, color_idx):
+        """Recolor a brick and record the edit for undo. Returns False if the brick already had that color"""
+        old_idx = self.set_brick_color(x, y, color_idx)
+        if old_idx == color_idx:
+            return False
+        
+        # A new edit makes the redo history obsolete
+        self.undo_stack.append((x, y, old_idx, color_idx))
+        self.redo_stack = []
+        return True
+    
+    def undo_brick_edit(self):
+        """Revert the last brick edit and return it as (x, y, old color index, new color index), or None"""
+        if not self.undo_stack:
+            return None
+        x, y, old_idx, new_idx = self.undo_stack.pop()
+        self.set_brick_color(x, y, old_idx)
+        self.redo_stack.append((x, y, old_idx, new_idx))
+        return x, y, old_idx, new_idx
+    
+    def redo_brick_edit(self):
+        """Re-apply the last undone brick edit and return it as (x, y, old color index, new color index), or None"""
+        if not self.redo_stack:
+            return None
+        x, y, old_idx, new_idx = self.redo_stack.pop()
+        self.set_brick_color(x, y, new_idx)
+        self.undo_stack.append((x, y, old_idx, new_idx))
+        return x, y, old_idx, new_idx
+    
+    def set_brick_color(self, x, y, color_idx):
+        """Set one brick to a Lego color, updating brick counts and dirty sections. Returns the previous color index"""
+        old_idx = int(self.color_index_map[y, x])
+        if old_idx == color_idx:
+            return old_idx
+        
+        self.color_index_map[y, x] = color_idx
+        self.mosaic_image.putpixel((x, y), self.lego_colors[color_idx])
+        
+        # Move one brick from the old color to the new color
+        old_name = self.lego_color_names[old_idx]
+        self.brick_counts[old_name] -= 1
+        if self.brick_counts[old_name] <= 0:
+            del self.brick_counts[old_name]
+            self.brick_colors.pop(old_name, None)
         
-        return closest_idx
+        new_name = self.lego_color_names[color_idx]
+        self.brick_counts[new_name] += 1
+        self.brick_colors[new_name] = self.lego_colors[color_idx]
+        
+        # Remember which 10x10 section has to be re-exported
+        self.dirty_sections.add((y // self.GRID_SIZE, x // self.GRID_SIZE))
+        return old_idx
+    
+    def refresh_mosaic(self):
+        """Redraw the mosaic preview and brick information after an edit"""
+        self.display_image(self.get_preview_image(self.mosaic_image, self.color_index_map),
+                           self.mosaic_image_label, max_size=400)
+        self.display_brick_info(*self.mosaic_image.size)
+        self.update_edit_buttons()
+    
+    def on_preview_style_changed(self):
+        """Redraw the mosaic preview in the selected style"""
+        if self.mosaic_image is not None:
+            self.display_image(self.get_preview_image(self.mosaic_image, self.color_index_map),
+                               self.mosaic_image_label, max_size=400)
+    
+    def get_preview_image(self, mosaic_image, index_map):
+        """Return the image to preview a mosaic with: the flat mosaic or its stud rendering"""
+        if self.stud_preview_var.get() and index_map is not None:
+            return self.render_stud_image(index_map, self.STUD_SIZE)
+        return mosaic_image
+    
+    def get_stud_atlas(self, stud_size):
+        """Return a (colors, stud_size, stud_size, 3) array with a shaded stud sprite for every Lego color"""
+        if stud_size not in self.stud_atlas_cache:
+            self.stud_atlas_cache[stud_size] = self.build_stud_atlas(stud_size)
+        return self.stud_atlas_cache[stud_size]
+    
+    def build_stud_atlas(self, stud_size):
+        """Pre-render a shaded stud sprite for every Lego color at the given size"""
+        # Pixel centers in brick units (0 to 1)
+        coords = (np.arange(stud_size) + 0.5) / stud_size
+        v, u = np.meshgrid(coords, coords, indexing="ij")
+        
+        def disc(center_u, center_v, radius):
+            # Anti-aliased disc coverage, one pixel of soft edge
+            distance = np.sqrt((u - center_u) ** 2 + (v - center_v) ** 2)
+            return np.clip((radius - distance) * stud_size + 0.5, 0, 1)
+        
+        # Brick face with a light top/left bevel and a dark bottom/right bevel
+        bevel = max(1, stud_size // 20) / stud_size
+        shade = np.ones((stud_size, stud_size))
+        shade[(u < bevel) | (v < bevel)] = 1.15
+        shade[(u > 1 - bevel) | (v > 1 - bevel)] = 0.7
+        
+        # Shadow cast by the stud towards the bottom right
+        shade *= 1 - 0.35 * disc(0.55, 0.56, 0.32)
+        
+        # Stud top, lit from the top left, with a darker rim
+        stud = disc(0.5, 0.5, 0.3)
+        distance = np.sqrt((u - 0.5) ** 2 + (v - 0.5) ** 2)
+        stud_shade = 1.1 - 0.4 * ((u - 0.5) + (v - 0.5)) - 0.25 * np.clip((distance - 0.24) / 0.06, 0, 1)
+        shade = shade * (1 - stud) + stud_shade * stud
+        
+        # Specular highlight so that dark colors still show their studs
+        highlight = 70 * disc(0.4, 0.4, 0.08) * stud
+        
+        palette = np.asarray(self.lego_colors, dtype=np.float64)
+        atlas = palette[:, None, None, :] * shade[None, :, :, None] + highlight[None, :, :, None]
+        return np.clip(atlas, 0, 255).astype(np.uint8)
+    
+    def render_stud_image(self, index_map, stud_size):
+        """Render a mosaic with realistic studs by gathering sprites from the stud atlas"""
+        height, width = index_map.shape
+        stud_image = Image.new("RGB", (width * stud_size, height * stud_size))
+        for box, tile in self.iter_stud_tiles(index_map, stud_size):
+            stud_image.paste(tile, box[:2])
+        return stud_image
+    
+    def iter_stud_tiles(self, index_map, stud_size, tile_bricks=32):
+        """Yield ((left, top, right, bottom), image) stud tiles of at most tile_bricks x tile_bricks bricks.
+        
+        Large mosaics can be shown or saved progressively, one tile at a time.
+        """
+        atlas = self.get_stud_atlas(stud_size)
+        height, width = index_map.shape
+        
+        for start_y in range(0, height, tile_bricks):
+            for start_x in range(0, width, tile_bricks):
+                indices = index_map[start_y:start_y + tile_bricks, start_x:start_x + tile_bricks]
+                rows, cols = indices.shape
+                
+                # (rows, cols, stud, stud, 3) -> (rows * stud, cols * stud, 3)
+                sprites = atlas[indices].transpose(0, 2, 1, 3, 4)
+                tile = Image.fromarray(sprites.reshape(rows * stud_size, cols * stud_size, 3), "RGB")
+                
+                left, top = start_x * stud_size, start_y * stud_size
+                yield (left, top, left + cols * stud_size, top + rows * stud_size), tile
     
     def display_brick_info(self, width, height):
         """Display information about the required Lego bricks"""
@@ -337,7 +773,7 @@ class LegoMosaicGenerator:
             os.makedirs(instructions_dir, exist_ok=True)
             
             # Create an overview image of the full mosaic with grid
-            self.create_overview_image(instructions_dir)
+            self.create_overview_image(instructions_dir, studs=self.stud_preview_var.get())
             
             # Create the grid-based instruction images
             self.create_grid_instructions(instructions_dir)
@@ -345,6 +781,11 @@ class LegoMosaicGenerator:
             # Create a summary text file
             self.create_summary_file(instructions_dir)
             
+            # Later edits can now be re-exported into this folder section by section
+            self.instructions_dir = instructions_dir
+            self.dirty_sections = set()
+            self.update_edit_buttons()
+            
             # Success message
             messagebox.showinfo("Instructions Generated", 
                                f"Building instructions have been saved to:\n{instructions_dir}")
@@ -354,75 +795,147 @@ class LegoMosaicGenerator:
             messagebox.showerror("Error", f"Failed to generate instructions: {e}")
             self.status_var.set("Error generating instructions")
     
-    def create_overview_image(self, output_dir):
-        """Create an overview image of the full mosaic with grid lines"""
+    def update_instructions(self):
+        """Re-export only the sections edited since the last export, plus the overview and summary"""
+        if not self.instructions_dir or not os.path.isdir(self.instructions_dir):
+            messagebox.showwarning("Warning", "Please download the building instructions first")
+            return
+        
+        if not self.dirty_sections:
+            self.status_var.set("Building instructions are up to date")
+            return
+        
+        try:
+            self.status_var.set("Updating building instructions...")
+            sections = sorted(self.dirty_sections)
+            
+            # Re-render the changed overview tiles and section images only
+            if self.overview_image is None or self.overview_studs != self.stud_preview_var.get():
+                # The preview style changed since the export, so the whole overview is redrawn
+                self.create_overview_image(self.instructions_dir, studs=self.stud_preview_var.get())
+            else:
+                self.update_overview_image(self.instructions_dir, sections)
+            for grid_row, grid_col in sections:
+                self.create_section_image(self.instructions_dir, grid_row, grid_col)
+            
+            # Brick counts may have changed, so rewrite the summary
+            self.create_summary_file(self.instructions_dir)
+            
+            self.dirty_sections = set()
+            self.update_edit_buttons()
+            
+            self.status_var.set(f"Updated {len(sections)} section(s) in {self.instructions_dir}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to update instructions: {e}")
+            self.status_var.set("Error updating instructions")
+    
+    def create_overview_image(self, output_dir, studs=False):
+        """Create an overview image of the full mosaic with grid lines, drawn with flat bricks or studs"""
         # Get dimensions
         width, height = self.mosaic_image.size
         
         # Create a larger version for better visibility
         scale_factor = 20  # Each Lego pixel will be 20x20 pixels
-        overview_img = Image.new("RGB", (width * scale_factor, height * scale_factor), color="white")
-        draw = ImageDraw.Draw(overview_img)
+        self.overview_image = Image.new("RGB", (width * scale_factor, height * scale_factor), color="white")
+        self.overview_studs = studs
+        
+        # Draw the mosaic one 10x10 section at a time
+        grid_cols = math.ceil(width / self.GRID_SIZE)
+        grid_rows = math.ceil(height / self.GRID_SIZE)
+        sections = [(grid_row, grid_col) for grid_row in range(grid_rows) for grid_col in range(grid_cols)]
+        self.update_overview_image(output_dir, sections)
+    
+    def update_overview_image(self, output_dir, sections):
+        """Redraw the given (grid_row, grid_col) tiles of the cached overview image and save it"""
+        if self.overview_image is None:
+            # Nothing cached yet, so render the whole overview
+            self.create_overview_image(output_dir)
+            return
+        
+        scale_factor = self.overview_image.width // self.mosaic_image.width
+        
+        # Section labels (A1, A2, B1, B2, etc.)
+        try:
+            font = ImageFont.truetype("arial.ttf", 24)
+        except:
+            font = ImageFont.load_default()
+        
+        # Each tile is drawn on its own, so re-rendering one never touches its neighbours
+        for grid_row, grid_col in sections:
+            tile = self.render_overview_tile(grid_row, grid_col, scale_factor, font)
+            self.overview_image.paste(tile, (grid_col * self.GRID_SIZE * scale_factor,
+                                             grid_row * self.GRID_SIZE * scale_factor))
+        
+        # Save the overview image
+        overview_path = os.path.join(output_dir, "00_Full_Mosaic_Overview.png")
+        self.overview_image.save(overview_path)
+    
+    def render_overview_tile(self, grid_row, grid_col, scale_factor, font):
+        """Render one 10x10 section of the overview image with its grid lines and label"""
+        width, height = self.mosaic_image.size
+        
+        # Calculate the boundaries of this grid section
+        start_x = grid_col * self.GRID_SIZE
+        start_y = grid_row * self.GRID_SIZE
+        end_x = min(start_x + self.GRID_SIZE, width)
+        end_y = min(start_y + self.GRID_SIZE, height)
+        tile_width = (end_x - start_x) * scale_factor
+        tile_height = (end_y - start_y) * scale_factor
+        
+        tile = Image.new("RGB", (tile_width, tile_height), color="white")
+        draw = ImageDraw.Draw(tile)
         
         # Draw the mosaic
-        for y in range(height):
-            for x in range(width):
-                pixel_color = self.mosaic_image.getpixel((x, y))
-                draw.rectangle([x * scale_factor, y * scale_factor, 
-                               (x+1) * scale_factor - 1, (y+1) * scale_factor - 1], 
-                               fill=pixel_color)
+        if self.overview_studs:
+            indices = self.color_index_map[start_y:end_y, start_x:end_x]
+            tile.paste(self.render_stud_image(indices, scale_factor), (0, 0))
+        else:
+            for y in range(start_y, end_y):
+                for x in range(start_x, end_x):
+                    pixel_color = self.mosaic_image.getpixel((x, y))
+                    draw.rectangle([(x - start_x) * scale_factor, (y - start_y) * scale_factor, 
+                                   (x - start_x + 1) * scale_factor - 1, (y - start_y + 1) * scale_factor - 1], 
+                                   fill=pixel_color)
         
         # Draw the grid
         grid_color = (200, 200, 200)  # Light gray
         
         # Draw horizontal grid lines
-        for y in range(0, height + 1):
+        for y in range(start_y, end_y + 1):
             if y % self.GRID_SIZE == 0:  # Major grid line (every 10)
                 line_color = (0, 0, 0)  # Black
                 line_width = 2
             else:
                 line_color = grid_color
                 line_width = 1
-            draw.line([(0, y * scale_factor), (width * scale_factor, y * scale_factor)], 
-                     fill=line_color, width=line_width)
+            line_y = (y - start_y) * scale_factor
+            draw.line([(0, line_y), (tile_width, line_y)], fill=line_color, width=line_width)
         
         # Draw vertical grid lines
-        for x in range(0, width + 1):
+        for x in range(start_x, end_x + 1):
             if x % self.GRID_SIZE == 0:  # Major grid line (every 10)
                 line_color = (0, 0, 0)  # Black
                 line_width = 2
             else:
                 line_color = grid_color
                 line_width = 1
-            draw.line([(x * scale_factor, 0), (x * scale_factor, height * scale_factor)], 
-                     fill=line_color, width=line_width)
+            line_x = (x - start_x) * scale_factor
+            draw.line([(line_x, 0), (line_x, tile_height)], fill=line_color, width=line_width)
         
-        # Add section labels (A1, A2, B1, B2, etc.)
-        try:
-            font = ImageFont.truetype("arial.ttf", 24)
-        except:
-            font = ImageFont.load_default()
+        # Label the section
+        row_label = chr(65 + grid_row)  # A, B, C...
+        col_label = str(1 + grid_col)  # 1, 2, 3...
+        grid_label = f"{row_label}{col_label}"
+        text_pos = (5, 5)
         
-        # Label each 10x10 section
-        for grid_y in range(0, height, self.GRID_SIZE):
-            row_label = chr(65 + grid_y // self.GRID_SIZE)  # A, B, C...
-            for grid_x in range(0, width, self.GRID_SIZE):
-                col_label = str(1 + grid_x // self.GRID_SIZE)  # 1, 2, 3...
-                grid_label = f"{row_label}{col_label}"
-                
-                # Calculate the center position of the grid
-                text_pos = (grid_x * scale_factor + 5, grid_y * scale_factor + 5)
-                
-                # Draw white background for text
-                text_bbox = draw.textbbox(text_pos, grid_label, font=font)
-                draw.rectangle(text_bbox, fill=(255, 255, 255, 180))
-                
-                # Draw the label
-                draw.text(text_pos, grid_label, fill=(0, 0, 0), font=font)
+        # Draw white background for text
+        text_bbox = draw.textbbox(text_pos, grid_label, font=font)
+        draw.rectangle(text_bbox, fill=(255, 255, 255, 180))
         
-        # Save the overview image
-        overview_path = os.path.join(output_dir, "00_Full_Mosaic_Overview.png")
-        overview_img.save(overview_path)
+        # Draw the label
+        draw.text(text_pos, grid_label, fill=(0, 0, 0), font=font)
+        
+        return tile
     
     def create_grid_instructions(self, output_dir):
         """Create instruction images for each 10x10 grid section"""
@@ -432,91 +945,98 @@ class LegoMosaicGenerator:
         grid_cols = math.ceil(width / self.GRID_SIZE)
         grid_rows = math.ceil(height / self.GRID_SIZE)
         
-        # Define the scale for the enlarged grid sections
-        scale_factor = 50  # Each Lego pixel will be 50x50 pixels
-        
         # Process each grid section
         for grid_row in range(grid_rows):
-            row_label = chr(65 + grid_row)  # A, B, C...
-            
             for grid_col in range(grid_cols):
-                col_label = str(grid_col + 1)  # 1, 2, 3...
-                grid_label = f"{row_label}{col_label}"
-                
-                # Calculate the boundaries of this grid section
-                start_x = grid_col * self.GRID_SIZE
-                start_y = grid_row * self.GRID_SIZE
-                end_x = min(start_x + self.GRID_SIZE, width)
-                end_y = min(start_y + self.GRID_SIZE, height)
-                
-                # Create an image for this grid section (with padding for labels)
-                padding = 50
-                grid_img = Image.new("RGB", 
-                                    ((end_x - start_x) * scale_factor + 2 * padding, 
-                                     (end_y - start_y) * scale_factor + 2 * padding), 
-                                    color="white")
-                draw = ImageDraw.Draw(grid_img)
+                self.create_section_image(output_dir, grid_row, grid_col)
+    
+    def create_section_image(self, output_dir, grid_row, grid_col):
+        """Create and save the instruction image for one 10x10 grid section"""
+        width, height = self.mosaic_image.size
+        
+        # Define the scale for the enlarged grid sections
+        scale_factor = 50  # Each Lego pixel will be 50x50 pixels
+        
+        row_label = chr(65 + grid_row)  # A, B, C...
+        col_label = str(grid_col + 1)  # 1, 2, 3...
+        grid_label = f"{row_label}{col_label}"
+        
+        # Calculate the boundaries of this grid section
+        start_x = grid_col * self.GRID_SIZE
+        start_y = grid_row * self.GRID_SIZE
+        end_x = min(start_x + self.GRID_SIZE, width)
+        end_y = min(start_y + self.GRID_SIZE, height)
+        
+        # Create an image for this grid section (with padding for labels)
+        padding = 50
+        grid_img = Image.new("RGB", 
+                            ((end_x - start_x) * scale_factor + 2 * padding, 
+                             (end_y - start_y) * scale_factor + 2 * padding), 
+                            color="white")
+        draw = ImageDraw.Draw(grid_img)
+        
+        # Font for the coordinates inside each brick
+        try:
+            font = ImageFont.truetype("arial.ttf", 12)
+        except:
+            font = ImageFont.load_default()
+        
+        # Draw the grid section
+        for y in range(start_y, end_y):
+            for x in range(start_x, end_x):
+                # Get the pixel color
+                pixel_color = self.mosaic_image.getpixel((x, y))
                 
-                # Draw the grid section
-                for y in range(start_y, end_y):
-                    for x in range(start_x, end_x):
-                        # Get the pixel color
-                        pixel_color = self.mosaic_image.getpixel((x, y))
-                        
-                        # Calculate position in the enlarged grid
-                        grid_pixel_x = (x - start_x) * scale_factor + padding
-                        grid_pixel_y = (y - start_y) * scale_factor + padding
-                        
-                        # Draw the enlarged pixel
-                        draw.rectangle([grid_pixel_x, grid_pixel_y, 
-                                       grid_pixel_x + scale_factor - 1, 
-                                       grid_pixel_y + scale_factor - 1], 
-                                       fill=pixel_color)
-                        
-                        # Add coordinates inside each brick
-                        position_label = f"{x+1},{y+1}"
-                        try:
-                            font = ImageFont.truetype("arial.ttf", 12)
-                        except:
-                            font = ImageFont.load_default()
-                        
-                        # Determine text color based on background
-                        r, g, b = pixel_color
-                        text_color = self.get_contrasting_text_color(r, g, b)
-                        
-                        # Calculate position for the text
-                        text_x = grid_pixel_x + scale_factor // 2 - 10
-                        text_y = grid_pixel_y + scale_factor // 2 - 6
-                        
-                        # Draw the position label
-                        draw.text((text_x, text_y), position_label, fill=text_color, font=font)
+                # Calculate position in the enlarged grid
+                grid_pixel_x = (x - start_x) * scale_factor + padding
+                grid_pixel_y = (y - start_y) * scale_factor + padding
                 
-                # Draw grid lines
-                for x in range(start_x, end_x + 1):
-                    line_x = (x - start_x) * scale_factor + padding
-                    draw.line([(line_x, padding), 
-                              (line_x, (end_y - start_y) * scale_factor + padding)], 
-                             fill=(100, 100, 100), width=1)
+                # Draw the enlarged pixel
+                draw.rectangle([grid_pixel_x, grid_pixel_y, 
+                               grid_pixel_x + scale_factor - 1, 
+                               grid_pixel_y + scale_factor - 1], 
+                               fill=pixel_color)
                 
-                for y in range(start_y, end_y + 1):
-                    line_y = (y - start_y) * scale_factor + padding
-                    draw.line([(padding, line_y), 
-                              ((end_x - start_x) * scale_factor + padding, line_y)], 
-                             fill=(100, 100, 100), width=1)
+                # Add coordinates inside each brick
+                position_label = f"{x+1},{y+1}"
                 
-                # Add section title
-                title = f"Section {grid_label} ({start_x+1},{start_y+1}) to ({end_x},{end_y})"
-                try:
-                    title_font = ImageFont.truetype("arial.ttf", 24)
-                except:
-                    title_font = ImageFont.load_default()
+                # Determine text color based on background
+                r, g, b = pixel_color
+                text_color = self.get_contrasting_text_color(r, g, b)
                 
-                # Draw the title
-                draw.text((padding, 10), title, fill=(0, 0, 0), font=title_font)
+                # Calculate position for the text
+                text_x = grid_pixel_x + scale_factor // 2 - 10
+                text_y = grid_pixel_y + scale_factor // 2 - 6
                 
-                # Save the grid section image
-                section_path = os.path.join(output_dir, f"{grid_label}_Section.png")
-                grid_img.save(section_path)
+                # Draw the position label
+                draw.text((text_x, text_y), position_label, fill=text_color, font=font)
+        
+        # Draw grid lines
+        for x in range(start_x, end_x + 1):
+            line_x = (x - start_x) * scale_factor + padding
+            draw.line([(line_x, padding), 
+                      (line_x, (end_y - start_y) * scale_factor + padding)], 
+                     fill=(100, 100, 100), width=1)
+        
+        for y in range(start_y, end_y + 1):
+            line_y = (y - start_y) * scale_factor + padding
+            draw.line([(padding, line_y), 
+                      ((end_x - start_x) * scale_factor + padding, line_y)], 
+                     fill=(100, 100, 100), width=1)
+        
+        # Add section title
+        title = f"Section {grid_label} ({start_x+1},{start_y+1}) to ({end_x},{end_y})"
+        try:
+            title_font = ImageFont.truetype("arial.ttf", 24)
+        except:
+            title_font = ImageFont.load_default()
+        
+        # Draw the title
+        draw.text((padding, 10), title, fill=(0, 0, 0), font=title_font)
+        
+        # Save the grid section image
+        section_path = os.path.join(output_dir, f"{grid_label}_Section.png")
+        grid_img.save(section_path)
     
     def create_summary_file(self, output_dir):
         """Create a summary text file with brick information"""
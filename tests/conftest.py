@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from lego_mosaic_generator import LegoMosaicGenerator
+
+
+@pytest.fixture
+def generator():
+    """A generator with a small palette, created without the Tk GUI or the Excel file"""
+    gen = LegoMosaicGenerator.__new__(LegoMosaicGenerator)
+    gen.LEGO_WIDTH = 0.314961
+    gen.MAX_LENGTH = 30
+    gen.MAX_LEGO_PIECES = int(gen.MAX_LENGTH / gen.LEGO_WIDTH)
+    gen.GRID_SIZE = 10
+    gen.lego_colors = [(0, 0, 0), (255, 255, 255), (200, 0, 0), (0, 150, 0),
+                       (0, 0, 200), (250, 200, 0), (120, 120, 120), (90, 40, 10)]
+    gen.lego_color_names = ["Black", "White", "Red", "Green", "Blue", "Yellow", "Gray", "Brown"]
+    gen.stud_atlas_cache = {}
+    return gen
+
+
+@pytest.fixture
+def random_image():
+    """Factory for reproducible random RGB images"""
+    def make(width, height, seed=0):
+        rng = np.random.default_rng(seed)
+        return Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), "RGB")
+    return make
@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+EDITS = [(0, 0, 3), (5, 12, 4), (26, 22, 2), (11, 3, 5), (5, 12, 1)]
+
+
+@pytest.fixture
+def editor(generator):
+    """A generator holding a 27x23 mosaic with a single Red brick, ready for editing"""
+    index_map = np.zeros((23, 27), dtype=np.int64)
+    index_map[::2, ::3] = 6
+    index_map[7, 8] = 2
+    generator.mosaic_image, generator.brick_counts, generator.brick_colors = \
+        generator.build_mosaic_from_indices(index_map)
+    generator.color_index_map = index_map
+    generator.undo_stack = []
+    generator.redo_stack = []
+    generator.dirty_sections = set()
+    generator.overview_image = None
+    generator.overview_studs = False
+    return generator
+
+
+def snapshot(gen):
+    return (gen.color_index_map.copy(), dict(gen.brick_counts), dict(gen.brick_colors),
+            np.asarray(gen.mosaic_image).copy())
+
+
+def assert_same_state(gen, state):
+    index_map, brick_counts, brick_colors, pixels = state
+    np.testing.assert_array_equal(gen.color_index_map, index_map)
+    assert dict(gen.brick_counts) == brick_counts
+    assert dict(gen.brick_colors) == brick_colors
+    np.testing.assert_array_equal(np.asarray(gen.mosaic_image), pixels)
+
+
+def test_edits_keep_brick_counts_consistent(editor):
+    for x, y, color_idx in EDITS:
+        assert editor.edit_brick(x, y, color_idx)
+    
+    _, expected_counts, expected_colors = editor.build_mosaic_from_indices(editor.color_index_map)
+    assert editor.brick_counts == expected_counts
+    assert editor.brick_colors == expected_colors
+    assert sum(editor.brick_counts.values()) == 27 * 23
+
+
+def test_color_is_removed_when_its_last_brick_changes(editor):
+    assert editor.brick_counts["Red"] == 1
+    
+    editor.edit_brick(8, 7, 0)
+    
+    assert "Red" not in editor.brick_counts
+    assert "Red" not in editor.brick_colors
+
+
+def test_setting_the_same_color_is_not_an_edit(editor):
+    assert not editor.edit_brick(8, 7, 2)
+    assert editor.undo_stack == []
+    assert editor.dirty_sections == set()
+
+
+def test_dirty_sections_hold_edited_sections(editor):
+    for x, y, color_idx in EDITS:
+        editor.edit_brick(x, y, color_idx)
+    
+    assert editor.dirty_sections == {(y // editor.GRID_SIZE, x // editor.GRID_SIZE) for x, y, _ in EDITS}
+
+
+def test_undo_and_redo_restore_state(editor):
+    before = snapshot(editor)
+    for x, y, color_idx in EDITS:
+        editor.edit_brick(x, y, color_idx)
+    after = snapshot(editor)
+    
+    while editor.undo_brick_edit() is not None:
+        pass
+    assert_same_state(editor, before)
+    
+    while editor.redo_brick_edit() is not None:
+        pass
+    assert_same_state(editor, after)
+    assert len(editor.undo_stack) == len(EDITS)
+
+
+def test_new_edit_clears_redo_history(editor):
+    editor.edit_brick(0, 0, 3)
+    editor.undo_brick_edit()
+    
+    editor.edit_brick(1, 1, 4)
+    
+    assert editor.redo_stack == []
+    assert editor.redo_brick_edit() is None
+
+
+@pytest.mark.parametrize("studs", [False, True])
+def test_incremental_overview_matches_full_render(editor, tmp_path, studs):
+    incremental_dir = tmp_path / "incremental"
+    full_dir = tmp_path / "full"
+    incremental_dir.mkdir()
+    full_dir.mkdir()
+    
+    editor.create_overview_image(str(incremental_dir), studs=studs)
+    editor.dirty_sections = set()
+    for x, y, color_idx in EDITS:
+        editor.edit_brick(x, y, color_idx)
+    editor.update_overview_image(str(incremental_dir), sorted(editor.dirty_sections))
+    
+    editor.create_overview_image(str(full_dir), studs=studs)
+    
+    incremental = Image.open(incremental_dir / "00_Full_Mosaic_Overview.png")
+    full = Image.open(full_dir / "00_Full_Mosaic_Overview.png")
+    np.testing.assert_array_equal(np.asarray(incremental), np.asarray(full))
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+
+def test_color_histogram_reconstructs_image(generator, random_image):
+    image = random_image(20, 15)
+    unique_colors, counts, inverse = generator.compute_color_histogram(image)
+    
+    assert counts.sum() == 20 * 15
+    assert len(np.unique(unique_colors, axis=0)) == len(unique_colors)
+    np.testing.assert_array_equal(unique_colors[inverse].reshape(15, 20, 3), np.asarray(image))
+
+
+@pytest.mark.parametrize("k", [1, 2, 3, 5, 7])
+def test_select_palette_subset_returns_k_distinct_colors(generator, random_image, k):
+    unique_colors, counts, _ = generator.compute_color_histogram(random_image(30, 30))
+    distances = generator.color_distances(unique_colors)
+    
+    selected = generator.select_palette_subset(distances, counts, k)
+    
+    assert len(selected) == k
+    assert len(set(selected.tolist())) == k
+    assert all(0 <= idx < len(generator.lego_colors) for idx in selected)
+
+
+def test_select_palette_subset_picks_colors_used_by_image(generator):
+    # Only red, blue and gray appear in the image
+    pixels = np.array([[(200, 0, 0), (0, 0, 200)], [(120, 120, 120), (200, 0, 0)]], dtype=np.uint8)
+    unique_colors, counts, _ = generator.compute_color_histogram(Image.fromarray(pixels, "RGB"))
+    
+    selected = generator.select_palette_subset(generator.color_distances(unique_colors), counts, 3)
+    
+    assert selected.tolist() == [2, 4, 6]
+
+
+def test_quantize_to_palette_limits_colors(generator, random_image):
+    index_map = generator.quantize_to_palette(random_image(25, 20), max_colors=3)
+    
+    assert index_map.shape == (20, 25)
+    assert len(np.unique(index_map)) <= 3
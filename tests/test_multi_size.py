@@ -0,0 +1,68 @@
+import math
+from collections import Counter
+
+import numpy as np
+import pytest
+from PIL import Image
+
+
+def test_cached_color_distances_match_uncached(generator, random_image):
+    color_cache = {}
+    first, _, _ = generator.compute_color_histogram(random_image(10, 10, seed=1))
+    second, _, _ = generator.compute_color_histogram(random_image(12, 12, seed=2))
+    overlap = np.concatenate([first[:20], second[:20]])
+    
+    for colors in (first, second, overlap):
+        np.testing.assert_array_equal(generator.cached_color_distances(colors, color_cache),
+                                      generator.color_distances(colors))
+    
+    # The cache holds every color seen so far exactly once
+    assert len(color_cache["keys"]) == len(np.unique(np.concatenate([first, second]), axis=0))
+
+
+def test_quantize_to_palette_with_cache_matches_uncached(generator, random_image):
+    color_cache = {}
+    for seed in range(3):
+        image = random_image(16, 9, seed=seed)
+        np.testing.assert_array_equal(generator.quantize_to_palette(image, color_cache=color_cache),
+                                      generator.quantize_to_palette(image))
+
+
+def test_duplicate_sizes_give_one_result_per_dimensions(generator, random_image):
+    # 60x40 image: both 95 and 60 are larger than or equal to the image and give 60x40
+    image = random_image(60, 40)
+    
+    results = generator.generate_multi_size_mosaics(image, [32, 32, generator.MAX_LEGO_PIECES, 60, 20])
+    
+    sizes = [result["image"].size for result in results]
+    assert sizes == [(32, 21), (60, 40), (20, 13)]
+
+
+@pytest.mark.parametrize("target_sizes", [[], [0], [32, -5], [32, 96], [10 ** 9]])
+def test_sizes_outside_limits_are_rejected(generator, random_image, target_sizes):
+    with pytest.raises(ValueError):
+        generator.generate_multi_size_mosaics(random_image(40, 30), target_sizes)
+
+
+def test_max_size_matches_per_pixel_conversion(generator, random_image):
+    image = random_image(400, 300, seed=4)
+    
+    result = generator.generate_multi_size_mosaics(image, [generator.MAX_LEGO_PIECES])[0]
+    
+    # Reference: the original pipeline, a NEAREST resize then the closest color for each pixel
+    resize_factor = generator.calculate_resize_factor(*image.size)
+    resized = image.resize((int(image.width / resize_factor), int(image.height / resize_factor)),
+                           Image.NEAREST)
+    expected_counts = Counter()
+    expected = np.zeros((resized.height, resized.width, 3), dtype=np.uint8)
+    for y in range(resized.height):
+        for x in range(resized.width):
+            r, g, b = resized.getpixel((x, y))
+            distances = [math.sqrt((r - lr) ** 2 + (g - lg) ** 2 + (b - lb) ** 2)
+                         for lr, lg, lb in generator.lego_colors]
+            closest_idx = distances.index(min(distances))
+            expected[y, x] = generator.lego_colors[closest_idx]
+            expected_counts[generator.lego_color_names[closest_idx]] += 1
+    
+    np.testing.assert_array_equal(np.asarray(result["image"]), expected)
+    assert result["brick_counts"] == expected_counts
@@ -0,0 +1,23 @@
+import numpy as np
+from PIL import Image
+
+
+def test_stud_atlas_has_one_sprite_per_color(generator):
+    atlas = generator.get_stud_atlas(12)
+    
+    assert atlas.shape == (len(generator.lego_colors), 12, 12, 3)
+    assert atlas.dtype == np.uint8
+    assert generator.get_stud_atlas(12) is atlas
+
+
+def test_stud_tiles_match_full_render(generator):
+    index_map = np.random.default_rng(3).integers(0, len(generator.lego_colors), (7, 11))
+    full = generator.render_stud_image(index_map, 8)
+    
+    pasted = Image.new("RGB", full.size)
+    for box, tile in generator.iter_stud_tiles(index_map, 8, tile_bricks=3):
+        assert tile.size == (box[2] - box[0], box[3] - box[1])
+        pasted.paste(tile, box[:2])
+    
+    assert full.size == (11 * 8, 7 * 8)
+    np.testing.assert_array_equal(np.asarray(pasted), np.asarray(full))